@@ -5,12 +5,24 @@ Loads and parses user data from CSV file.
 Caches data in memory to avoid re-reading on each request.
 """
 import csv
-from datetime import datetime
+from datetime import date
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: fall back to csv.DictReader
+    pa = None
 
 # Cache for loaded CSV data
 _cached_data: Optional[List[Dict[str, any]]] = None
+_cached_by_id: Optional[Dict[str, Dict[str, any]]] = None
+_cached_columns: Optional[Dict[str, np.ndarray]] = None
+_indexed_users: Optional[List[Dict[str, any]]] = None  # list the id index and columns were built from
 
 
 def load_users(csv_path: Optional[str] = None) -> List[Dict[str, any]]:
@@ -27,7 +39,7 @@ def load_users(csv_path: Optional[str] = None) -> List[Dict[str, any]]:
         FileNotFoundError: If CSV file doesn't exist
         ValueError: If CSV parsing fails
     """
-    global _cached_data
+    global _cached_data, _cached_by_id, _cached_columns, _indexed_users
     
     # Return cached data if available
     if _cached_data is not None:
@@ -42,6 +54,68 @@ def load_users(csv_path: Optional[str] = None) -> List[Dict[str, any]]:
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
     
+    users = None
+    columns = None
+    if pa is not None:
+        try:
+            users, columns = _read_with_arrow(csv_path)
+        except pa.ArrowInvalid:
+            # Arrow could not coerce a value (e.g. a malformed date); the row-by-row
+            # reader below reports the offending value or keeps it as a string
+            users = None
+    
+    if users is None:
+        users = _read_with_csv(csv_path)
+        columns = _build_columns(users)
+    
+    # Cache the data along with an id index and filter columns
+    _cached_data = users
+    _cached_by_id = _build_id_index(users)
+    _cached_columns = columns
+    _indexed_users = users
+    return users
+
+
+def _read_with_arrow(csv_path: Path) -> Tuple[List[Dict[str, any]], Dict[str, np.ndarray]]:
+    """Parse the CSV with Arrow, typing created_date as a date and age as an integer."""
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f), [])
+    
+    # Keep every other column as a string, matching csv.DictReader
+    column_types = {name: pa.string() for name in header}
+    if 'created_date' in column_types:
+        column_types['created_date'] = pa.date32()
+    if 'age' in column_types:
+        column_types['age'] = pa.int32()
+    
+    # Only blank fields are missing; anything else that fails to convert (e.g. "NA")
+    # raises ArrowInvalid so load_users falls back to csv.DictReader
+    convert_options = pa_csv.ConvertOptions(column_types=column_types, null_values=[''])
+    
+    # Parse straight from a memory map of the file rather than buffered reads
+    with pa.memory_map(str(csv_path), 'r') as source:
+        table = pa_csv.read_csv(source, convert_options=convert_options)
+    users = table.to_pylist()
+    
+    # csv.DictReader leaves blank fields as empty strings, so do the same for the typed columns
+    for name in ('created_date', 'age'):
+        if name in column_types and table.column(name).null_count:
+            for user in users:
+                if user[name] is None:
+                    user[name] = ''
+    
+    if 'created_date' not in column_types or 'profession' not in column_types:
+        return users, _build_columns(users)
+    
+    columns = {
+        'created_date': table.column('created_date').to_numpy().astype('datetime64[D]'),
+        'profession_lower': pc.utf8_lower(table.column('profession')).to_numpy().astype(str),
+    }
+    return users, columns
+
+
+def _read_with_csv(csv_path: Path) -> List[Dict[str, any]]:
+    """Parse the CSV row by row with csv.DictReader."""
     users = []
     try:
         with open(csv_path, 'r', newline='', encoding='utf-8') as f:
@@ -50,7 +124,7 @@ def load_users(csv_path: Optional[str] = None) -> List[Dict[str, any]]:
                 # Parse created_date string to date object for filtering
                 if 'created_date' in row and row['created_date']:
                     try:
-                        row['created_date'] = datetime.strptime(row['created_date'], '%Y-%m-%d').date()
+                        row['created_date'] = date.fromisoformat(row['created_date'])
                     except ValueError as e:
                         raise ValueError(f"Invalid date format in CSV: {row.get('created_date')}") from e
                 
@@ -62,33 +136,85 @@ def load_users(csv_path: Optional[str] = None) -> List[Dict[str, any]]:
                         pass  # Keep as string if conversion fails
                 
                 users.append(row)
-        
-        # Cache the data
-        _cached_data = users
         return users
         
     except csv.Error as e:
         raise ValueError(f"Error parsing CSV file: {e}") from e
 
 
-def get_user_by_id(user_id: str) -> Optional[Dict[str, any]]:
+def get_user_by_id(user_id: str, users: Optional[List[Dict[str, any]]] = None) -> Optional[Dict[str, any]]:
     """
     Get a single user by ID.
     
     Args:
         user_id: User ID to search for
+        users: Optional already-loaded users. Defaults to load_users()
         
     Returns:
         User dictionary if found, None otherwise
     """
-    users = load_users()
+    return get_user_dict(users).get(str(user_id))
+
+
+def get_user_dict(users: Optional[List[Dict[str, any]]] = None) -> Dict[str, Dict[str, any]]:
+    """
+    Get all users keyed by ID.
+    
+    Args:
+        users: Optional already-loaded users. Defaults to load_users()
+        
+    Returns:
+        Dictionary mapping user ID to user dictionary
+    """
+    _index_users(load_users() if users is None else users)
+    return _cached_by_id
+
+
+def get_user_columns(users: Optional[List[Dict[str, any]]] = None) -> Dict[str, np.ndarray]:
+    """
+    Get column arrays for vectorized filtering, aligned with the order of users.
+    
+    Args:
+        users: Optional already-loaded users. Defaults to load_users()
+        
+    Returns:
+        Dictionary with 'created_date' (datetime64[D], NaT when missing)
+        and 'profession_lower' (lowercased professions as a fixed-width unicode array)
+    """
+    _index_users(load_users() if users is None else users)
+    return _cached_columns
+
+
+def _index_users(users: List[Dict[str, any]]) -> None:
+    """Build the id index and filter columns, unless they were already built from this list."""
+    global _cached_by_id, _cached_columns, _indexed_users
+    if users is not _indexed_users:
+        _cached_by_id = _build_id_index(users)
+        _cached_columns = _build_columns(users)
+        _indexed_users = users
+
+
+def _build_id_index(users: List[Dict[str, any]]) -> Dict[str, Dict[str, any]]:
+    """Map each user ID to its first row, so duplicate IDs resolve like a linear scan."""
+    by_id = {}
     for user in users:
-        if user.get('id') == str(user_id):
-            return user
-    return None
+        if 'id' in user:
+            by_id.setdefault(user['id'], user)
+    return by_id
+
+
+def _build_columns(users: List[Dict[str, any]]) -> Dict[str, np.ndarray]:
+    """Convert row dictionaries into the column arrays used for filtering."""
+    return {
+        'created_date': np.array([user.get('created_date') for user in users], dtype='datetime64[D]'),
+        'profession_lower': np.array([user.get('profession', '').lower() for user in users], dtype=str),
+    }
 
 
 def clear_cache():
     """Clear the cached CSV data (useful for testing)."""
-    global _cached_data
+    global _cached_data, _cached_by_id, _cached_columns, _indexed_users
     _cached_data = None
+    _cached_by_id = None
+    _cached_columns = None
+    _indexed_users = None
@@ -3,16 +3,26 @@ FastAPI Application
 
 Main API endpoints for user data queries.
 """
+import asyncio
 from datetime import date
-from typing import Optional, List, Dict
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional, List, Dict
+
+import numpy as np
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from .csv_reader import load_users, get_user_by_id
+from .csv_reader import load_users, get_user_by_id, get_user_dict, get_user_columns
 from .vector_search import initialize_vector_db, search_similar_professions
 
-app = FastAPI(title="User API", description="API for querying user data from CSV")
+# orjson serializes date objects natively, so rows are returned without per-row conversion
+app = FastAPI(
+    title="User API",
+    description="API for querying user data from CSV",
+    default_response_class=ORJSONResponse,
+)
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -23,13 +33,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profession embeddings are cached here so restarts skip re-embedding unchanged data
+EMBEDDING_CACHE_DIR = Path(__file__).parent / 'data' / '.cache'
+
+# Vector search state, (re)set on startup:
+#   vector_index: the built VectorIndex
+#   vector_ready: set once building the index has finished; /users/search is unavailable until then
+#   vector_init_task: the background task building the index
+#   vector_init_error: why building the index failed, if it did
+app.state.vector_index = None
+app.state.vector_ready = None
+app.state.vector_init_task = None
+app.state.vector_init_error = None
+
+
+def get_user_loader() -> Callable[[], List[Dict]]:
+    """Dependency providing the function that loads users (override in tests via app.dependency_overrides)."""
+    return load_users
+
+
+def _resolve_user_loader() -> Callable[[], List[Dict]]:
+    """Resolve get_user_loader outside a request, honoring dependency overrides."""
+    return app.dependency_overrides.get(get_user_loader, get_user_loader)()
+
+
 # Initialize data on startup
 @app.on_event("startup")
 async def startup_event():
-    """Load CSV data and initialize vector database on application startup."""
-    users = load_users()
-    initialize_vector_db(users)
-    print(f"Loaded {len(users)} users and initialized vector search")
+    """Load CSV data and start building the vector database in the background."""
+    # Startup events don't support Depends, so resolve the loader directly
+    users = _resolve_user_loader()()
+    app.state.vector_index = None
+    app.state.vector_init_error = None
+    app.state.vector_ready = asyncio.Event()
+    app.state.vector_init_task = asyncio.create_task(_init_vectors(users))
+    print(f"Loaded {len(users)} users, initializing vector search in the background")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop waiting for a vector database build that is still running."""
+    init_task = app.state.vector_init_task
+    if init_task is not None and not init_task.done():
+        # The executor thread finishes on its own; this only drops the pending task
+        init_task.cancel()
+        try:
+            await init_task
+        except asyncio.CancelledError:
+            pass
+    app.state.vector_init_task = None
+
+
+async def _init_vectors(users: List[Dict]) -> None:
+    """Build the vector database off the event loop, then mark search as ready (or failed)."""
+    loop = asyncio.get_running_loop()
+    try:
+        app.state.vector_index = await loop.run_in_executor(
+            None, partial(initialize_vector_db, users, db_path=EMBEDDING_CACHE_DIR)
+        )
+    except Exception as e:
+        # Keep the error for /users/search rather than leaving it unretrieved on the task
+        app.state.vector_init_error = e
+        print(f"Vector search initialization failed: {e}")
+    else:
+        print("Initialized vector search")
+    finally:
+        app.state.vector_ready.set()
 
 
 @app.get("/")
@@ -47,10 +116,12 @@ async def root():
 
 @app.get("/users/search")
 async def search_users_by_profession(
+    request: Request,
     profession: str = Query(..., description="Profession text to search for semantically"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of results to return"),
     start_date: Optional[str] = Query(None, description="Filter users created on/after this date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="Filter users created on/before this date (YYYY-MM-DD)")
+    end_date: Optional[str] = Query(None, description="Filter users created on/before this date (YYYY-MM-DD)"),
+    user_loader: Callable[[], List[Dict]] = Depends(get_user_loader),
 ):
     """
     Semantic search for users by profession using vector similarity.
@@ -80,46 +151,40 @@ async def search_users_by_profession(
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid end_date format. Use YYYY-MM-DD")
     
-    # Search for similar professions (fetch more results to account for date filtering)
+    state = request.app.state
+    if state.vector_ready is None or not state.vector_ready.is_set():
+        raise HTTPException(status_code=503, detail="Vector index warming up, try again shortly")
+    if state.vector_init_error is not None:
+        raise HTTPException(status_code=500, detail=f"Vector search initialization failed: {state.vector_init_error}")
+    
+    # Restrict the search to users inside the date range (aligned with the order the index was built from)
+    users = user_loader()
+    candidate_mask = None
+    if start_date_obj or end_date_obj:
+        candidate_mask = _date_mask(get_user_columns(users)['created_date'], start_date_obj, end_date_obj)
+    
+    # Search for similar professions among the candidates
     try:
-        search_results = search_similar_professions(profession, limit=limit * 2)
+        search_results = search_similar_professions(
+            profession, limit=limit, index=state.vector_index, candidate_mask=candidate_mask
+        )
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=f"Vector search error: {str(e)}")
     
     # Get full user records from CSV
-    users = load_users()
-    user_dict = {user['id']: user for user in users}
+    user_dict = get_user_dict(users)
     
-    # Build response with full user data and similarity scores, applying date filters
+    # Build response with full user data and similarity scores
     results = []
     for user_id, similarity_score, profession_text in search_results:
         if user_id in user_dict:
-            user = user_dict[user_id].copy()
-            
-            # Apply date filters
-            if start_date_obj and user.get('created_date'):
-                if user['created_date'] < start_date_obj:
-                    continue
-            
-            if end_date_obj and user.get('created_date'):
-                if user['created_date'] > end_date_obj:
-                    continue
-            
-            # Convert date to string for JSON
-            if 'created_date' in user and hasattr(user['created_date'], 'isoformat'):
-                user['created_date'] = user['created_date'].isoformat()
-            # Add similarity score
-            user['similarity_score'] = round(similarity_score, 4)
-            results.append(user)
-            
-            if len(results) >= limit:
-                break
-    
-    return results
+            results.append({**user_dict[user_id], 'similarity_score': round(similarity_score, 4)})
+    
+    return ORJSONResponse(results)
 
 
 @app.get("/users/{user_id}")
-async def get_user(user_id: str):
+async def get_user(user_id: str, user_loader: Callable[[], List[Dict]] = Depends(get_user_loader)):
     """
     Get a specific user by ID.
     
@@ -132,23 +197,19 @@ async def get_user(user_id: str):
     Raises:
         404: If user not found
     """
-    user = get_user_by_id(user_id)
+    user = get_user_by_id(user_id, user_loader())
     if user is None:
         raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
     
-    # Convert date object back to string for JSON serialization
-    if 'created_date' in user and hasattr(user['created_date'], 'isoformat'):
-        user = user.copy()
-        user['created_date'] = user['created_date'].isoformat()
-    
-    return user
+    return ORJSONResponse(user)
 
 
 @app.get("/users")
 async def get_users(
     start_date: Optional[str] = Query(None, description="Filter users created on/after this date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Filter users created on/before this date (YYYY-MM-DD)"),
-    profession: Optional[str] = Query(None, description="Filter by exact profession match")
+    profession: Optional[str] = Query(None, description="Filter by exact profession match"),
+    user_loader: Callable[[], List[Dict]] = Depends(get_user_loader),
 ):
     """
     Get list of users with optional filters.
@@ -161,7 +222,7 @@ async def get_users(
     Returns:
         List of user objects matching the filters
     """
-    users = load_users()
+    users = user_loader()
     
     # Parse date strings if provided
     start_date_obj = None
@@ -179,34 +240,31 @@ async def get_users(
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid end_date format. Use YYYY-MM-DD")
     
-    # Apply filters
-    filtered_users = []
-    for user in users:
-        # Date range filter
-        if start_date_obj and user.get('created_date'):
-            if user['created_date'] < start_date_obj:
-                continue
-        
-        if end_date_obj and user.get('created_date'):
-            if user['created_date'] > end_date_obj:
-                continue
-        
-        # Profession filter (exact match)
-        if profession:
-            if user.get('profession', '').lower() != profession.lower():
-                continue
-        
-        filtered_users.append(user)
+    # Apply filters as vectorized comparisons over the column arrays
+    columns = get_user_columns(users)
+    mask = _date_mask(columns['created_date'], start_date_obj, end_date_obj)
+    
+    # Profession filter (exact match)
+    if profession:
+        mask &= columns['profession_lower'] == profession.lower()
     
-    # Convert date objects to strings for JSON serialization
-    result = []
-    for user in filtered_users:
-        user_copy = user.copy()
-        if 'created_date' in user_copy and hasattr(user_copy['created_date'], 'isoformat'):
-            user_copy['created_date'] = user_copy['created_date'].isoformat()
-        result.append(user_copy)
+    filtered_users = [users[i] for i in np.flatnonzero(mask)]
     
-    return result
+    return ORJSONResponse(filtered_users)
+
+
+def _date_mask(created_dates: np.ndarray, start_date_obj: Optional[date], end_date_obj: Optional[date]) -> np.ndarray:
+    """
+    Build a boolean mask of users created within the given date range.
+    
+    Users without a created_date are never excluded by the date filters.
+    """
+    mask = np.ones(created_dates.shape[0], dtype=bool)
+    if start_date_obj:
+        mask &= (created_dates >= np.datetime64(start_date_obj)) | np.isnat(created_dates)
+    if end_date_obj:
+        mask &= (created_dates <= np.datetime64(end_date_obj)) | np.isnat(created_dates)
+    return mask
 
 
 if __name__ == "__main__":
@@ -2,97 +2,376 @@
 Vector Search Module
 
 Handles semantic similarity search for professions using sentence-transformers and in-memory cosine similarity.
-Uses numpy/scipy for similarity calculations - no SQLite extensions required.
+Uses numpy for similarity calculations - no SQLite extensions required.
 """
-from typing import List, Tuple, Optional, Dict
+import hashlib
+import importlib.util
+import os
+import platform
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, Union
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from scipy.spatial.distance import cosine
+import torch
 
-# Global variables for model and embeddings
+try:
+    import hnswlib
+except ImportError:  # optional: fall back to exhaustive search
+    hnswlib = None
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# Dynamically int8-quantized ONNX exports published in the model repository, one per CPU family
+ONNX_MODEL_FILES = {
+    'arm64': 'onnx/model_qint8_arm64.onnx',
+    'avx512_vnni': 'onnx/model_qint8_avx512_vnni.onnx',
+    'avx2': 'onnx/model_quint8_avx2.onnx',
+}
+
+# Build an HNSW graph only when a linear scan would be noticeably slow
+HNSW_MIN_ELEMENTS = 1000
+HNSW_EF_SEARCH = 64
+
+# Rows of an int8 matrix dequantized at a time, bounding the float32 scratch space per query
+QUANTIZED_BLOCK_ROWS = 4096
+
+
+@dataclass(frozen=True)
+class VectorIndex:
+    """Profession embeddings and the lookup arrays needed to map them back to users."""
+    matrix: np.ndarray  # (K, 384) float32 (or int8 when quantized), one L2-normalized row per unique profession
+    professions: List[str]  # row -> profession text
+    profession_users: List[np.ndarray]  # row -> positions in user_ids of users with that profession
+    user_ids: np.ndarray  # position -> user_id
+    user_rows: np.ndarray  # position -> index of the user in the csv_data the index was built from
+    user_professions: np.ndarray  # position -> profession row
+    scale: Optional[float] = None  # dequantization factor when matrix is int8
+    hnsw: Optional["hnswlib.Index"] = None  # approximate nearest-neighbor graph over the same rows
+
+
+# Global variables for model and the default index
 _model: Optional[SentenceTransformer] = None
-_embeddings: Dict[str, np.ndarray] = {}  # user_id -> embedding
-_professions: Dict[str, str] = {}  # user_id -> profession text
+_vector_index: Optional[VectorIndex] = None
 
 
-def initialize_vector_db(csv_data: List[dict], db_path: Optional[str] = None) -> None:
+def initialize_vector_db(
+    csv_data: List[dict],
+    db_path: Optional[Union[str, Path]] = None,
+    quantize: bool = False,
+) -> Optional[VectorIndex]:
     """
     Initialize in-memory vector embeddings for all professions.
     
     Args:
         csv_data: List of user dictionaries from CSV
-        db_path: Ignored (kept for API compatibility)
+        db_path: Optional directory for caching profession embeddings across restarts
+        quantize: Store embeddings as int8, a quarter of the float32 size, at slightly lower
+            precision. Queries dequantize fixed-size row blocks, so they need only a small
+            float32 buffer but are somewhat slower than the float32 scan. An HNSW graph, when built,
+            keeps its own float32 copy, so this saves little memory for large profession sets.
+        
+    Returns:
+        The built VectorIndex (also used as the default for searches), or None if no user has a profession
     """
-    global _model, _embeddings, _professions
+    global _model, _vector_index
     
     # Initialize sentence-transformers model (downloads on first use)
     if _model is None:
-        _model = SentenceTransformer('all-MiniLM-L6-v2')
+        _model = _load_model()
     
     # Clear existing data
-    _embeddings.clear()
-    _professions.clear()
+    close_connection()
     
-    # Collect professions to embed
-    professions_to_embed = []
+    # Collect unique professions to embed, remembering which users share each one
+    profession_users: Dict[str, List[int]] = {}
     user_ids = []
-    profession_texts = []
+    user_rows = []
     
-    for user in csv_data:
+    for row, user in enumerate(csv_data):
         profession = user.get('profession', '')
         user_id = user.get('id', '')
         if profession and user_id:
-            professions_to_embed.append(profession)
+            profession_users.setdefault(profession, []).append(len(user_ids))
             user_ids.append(user_id)
-            profession_texts.append(profession)
+            user_rows.append(row)
     
-    if professions_to_embed:
-        # Generate embeddings in batch
-        embeddings = _model.encode(professions_to_embed, show_progress_bar=False)
-        
-        # Store in memory
-        for embedding, profession, user_id in zip(embeddings, profession_texts, user_ids):
-            _embeddings[user_id] = embedding
-            _professions[user_id] = profession
+    professions_to_embed = list(profession_users)
+    
+    if not professions_to_embed:
+        return None
+    
+    # Reuse embeddings from a previous run when the model and profession list are unchanged
+    cache_path = _embedding_cache_path(db_path, professions_to_embed) if db_path else None
+    embeddings = _load_embedding_cache(cache_path, len(professions_to_embed)) if cache_path else None
+    if embeddings is None:
+        # Generate unit-length embeddings in batch so cosine similarity is a plain dot product
+        embeddings = _model.encode(
+            professions_to_embed,
+            batch_size=128,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        if cache_path is not None:
+            _save_embedding_cache(cache_path, np.ascontiguousarray(embeddings, dtype=np.float32))
+    
+    # Store as one contiguous matrix with parallel profession/user arrays
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    hnsw = None
+    if hnswlib is not None and len(matrix) >= HNSW_MIN_ELEMENTS:
+        hnsw = hnswlib.Index(space='cosine', dim=matrix.shape[1])
+        hnsw.init_index(max_elements=len(matrix), ef_construction=200, M=16)
+        hnsw.add_items(matrix, np.arange(len(matrix)))
+        hnsw.set_ef(HNSW_EF_SEARCH)
+    scale = None
+    if quantize:
+        # Symmetric per-matrix int8 quantization: largest component maps to +/-127
+        quantize_scale = 127.0 / float(np.max(np.abs(matrix)))
+        matrix = np.round(matrix * quantize_scale).astype(np.int8)
+        scale = 1.0 / quantize_scale
+    
+    user_professions = np.empty(len(user_ids), dtype=np.intp)
+    for profession_row, positions in enumerate(profession_users.values()):
+        user_professions[positions] = profession_row
+    
+    _vector_index = VectorIndex(
+        matrix=matrix,
+        professions=professions_to_embed,
+        profession_users=[np.array(positions, dtype=np.intp) for positions in profession_users.values()],
+        user_ids=np.array(user_ids, dtype=object),
+        user_rows=np.array(user_rows, dtype=np.intp),
+        user_professions=user_professions,
+        scale=scale,
+        hnsw=hnsw,
+    )
+    return _vector_index
+
+
+def _embedding_cache_path(cache_dir: Union[str, Path], professions: List[str]) -> Path:
+    """Path of the cached embeddings for this model and ordered profession list."""
+    model_variant = f"{MODEL_NAME}|{getattr(_model, 'backend', 'torch')}|{getattr(_model, 'device', 'cpu')}"
+    model_key = hashlib.sha256(model_variant.encode('utf-8')).hexdigest()[:8]
+    digest = hashlib.sha256()
+    for profession in professions:
+        digest.update(b'\0' + profession.encode('utf-8'))
+    return Path(cache_dir) / f"embeddings_{model_key}_{digest.hexdigest()[:16]}.npy"
+
+
+def _load_embedding_cache(cache_path: Path, num_rows: int) -> Optional[np.ndarray]:
+    """
+    Memory-map cached embeddings, or return None if there are none usable.
+    
+    A corrupt file, or one whose shape does not match the professions, is deleted
+    so the embeddings are regenerated and cached again.
+    """
+    if not cache_path.exists():
+        return None
+    
+    get_dimension = getattr(_model, 'get_sentence_embedding_dimension', None)
+    dim = get_dimension() if get_dimension is not None else None
+    try:
+        embeddings = np.load(cache_path, mmap_mode='r')
+        expected_shape = (num_rows, embeddings.shape[-1] if dim is None else dim)
+        if embeddings.shape != expected_shape:
+            raise ValueError(f"shape {embeddings.shape} does not match expected {expected_shape}")
+        return embeddings
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unusable embedding cache {cache_path}: {e}")
+        try:
+            cache_path.unlink()
+        except OSError:
+            pass  # overwritten by the next successful write instead
+        return None
 
 
-def search_similar_professions(query_profession: str, limit: int = 10) -> List[Tuple[str, float, str]]:
+def _save_embedding_cache(cache_path: Path, embeddings: np.ndarray) -> None:
+    """
+    Write embeddings atomically so a concurrent reader never sees a partial file,
+    then remove embeddings of earlier profession lists for the same model variant.
+    """
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, embeddings)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write embedding cache {cache_path}: {e}")
+        return
+    
+    model_prefix = cache_path.stem.rsplit('_', 1)[0]
+    for stale_path in cache_path.parent.glob(f"{model_prefix}_*.npy"):
+        # Leave other processes' in-progress temporary files alone
+        if stale_path == cache_path or stale_path.suffixes != ['.npy']:
+            continue
+        try:
+            stale_path.unlink()
+        except OSError:
+            pass  # already removed, or still open elsewhere; retried on the next write
+
+
+def _load_model() -> SentenceTransformer:
+    """
+    Load the embedding model.
+    
+    Uses the PyTorch model in half precision when a CUDA GPU is available.
+    On CPU, prefers the int8-quantized ONNX Runtime export when the ONNX
+    extras are installed (pip install "sentence-transformers[onnx]"),
+    falling back to the default PyTorch model otherwise.
+    """
+    if torch.cuda.is_available():
+        return SentenceTransformer(MODEL_NAME, device='cuda').half()
+    
+    # Decide up front: sentence-transformers reports missing ONNX extras with a bare Exception
+    if _onnx_available():
+        return SentenceTransformer(MODEL_NAME, backend='onnx', model_kwargs={'file_name': _onnx_model_file()})
+    return SentenceTransformer(MODEL_NAME)
+
+
+def _onnx_available() -> bool:
+    """Whether the modules the ONNX backend imports (optimum.onnxruntime and onnxruntime) are installed."""
+    try:
+        return (
+            importlib.util.find_spec('onnxruntime') is not None
+            and importlib.util.find_spec('optimum.onnxruntime') is not None
+        )
+    except ImportError:  # optimum itself is not installed
+        return False
+
+
+def _onnx_model_file() -> str:
+    """Pick the quantized ONNX export built for this CPU."""
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return ONNX_MODEL_FILES['arm64']
+    if 'avx512_vnni' in _cpu_flags():
+        return ONNX_MODEL_FILES['avx512_vnni']
+    return ONNX_MODEL_FILES['avx2']
+
+
+def _cpu_flags() -> set:
+    """CPU feature flags from /proc/cpuinfo (empty where it is not available)."""
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def search_similar_professions(
+    query_profession: str,
+    limit: int = 10,
+    index: Optional[VectorIndex] = None,
+    candidate_mask: Optional[np.ndarray] = None,
+) -> List[Tuple[str, float, str]]:
     """
     Search for similar professions using vector similarity.
     
     Args:
         query_profession: Profession text to search for
         limit: Maximum number of results to return
+        index: Index to search. Defaults to the one built by the last initialize_vector_db() call
+        candidate_mask: Optional boolean array aligned with the csv_data the index was built from;
+            only users where it is True are returned
         
     Returns:
         List of tuples: (user_id, similarity_score, profession) ordered by relevance
         Similarity scores are cosine similarity (higher is more similar, range 0-1)
     """
-    global _model, _embeddings, _professions
-    
-    if _model is None or not _embeddings:
+    if index is None:
+        index = _vector_index
+    if _model is None or index is None:
         raise RuntimeError("Vector database not initialized. Call initialize_vector_db() first.")
     
-    # Generate embedding for query
-    query_embedding = _model.encode([query_profession], show_progress_bar=False)[0]
+    # Generate unit-length embedding for query (cached for repeated queries)
+    query_embedding = _encode_query(query_profession.strip().lower())
+    
+    # Restrict to professions held by at least one candidate user
+    user_allowed = None
+    profession_allowed = None
+    if candidate_mask is not None:
+        user_allowed = candidate_mask[index.user_rows]
+        profession_allowed = np.bincount(
+            index.user_professions[user_allowed], minlength=len(index.professions)
+        ) > 0
+    
+    # Every remaining profession has at least one allowed user, so the top `limit` cover `limit` users
+    available = len(index.professions) if profession_allowed is None else int(profession_allowed.sum())
+    k = min(limit, available)
+    if k <= 0:
+        return []
     
-    # Calculate cosine similarity with all stored embeddings
-    similarities = []
-    for user_id, embedding in _embeddings.items():
-        # Cosine similarity: 1 - cosine_distance
-        # cosine() returns distance (0 = identical, 2 = opposite)
-        # similarity = 1 - (distance / 2) gives us 1 = identical, 0 = opposite
-        distance = cosine(query_embedding, embedding)
-        similarity = 1.0 - (distance / 2.0)
-        similarities.append((user_id, similarity, _professions[user_id]))
+    if index.hnsw is not None:
+        # Approximate top-k via graph traversal; cosine distance is 1 - cosine similarity
+        index.hnsw.set_ef(max(HNSW_EF_SEARCH, k))
+        label_filter = None if profession_allowed is None else (lambda label: bool(profession_allowed[label]))
+        labels, distances = index.hnsw.knn_query(query_embedding, k=k, filter=label_filter)
+        return _expand_to_users(index, labels[0], (2.0 - distances[0]) / 2.0, limit, user_allowed)
     
-    # Sort by similarity (descending) and return top results
-    similarities.sort(key=lambda x: x[1], reverse=True)
-    return similarities[:limit]
+    # Cosine similarity against every stored embedding in a single matrix-vector product
+    # (float32 SGEMV in BLAS; both sides are pre-normalized so no per-row norms are needed)
+    matrix = index.matrix
+    if index.scale is None:
+        cosine = matrix.dot(query_embedding)
+    else:
+        # Upcast one block of rows at a time so peak memory stays near the int8 matrix size
+        cosine = np.empty(len(matrix), dtype=np.float32)
+        query_scaled = query_embedding * np.float32(index.scale)
+        for start in range(0, len(matrix), QUANTIZED_BLOCK_ROWS):
+            stop = start + QUANTIZED_BLOCK_ROWS
+            np.dot(matrix[start:stop].astype(np.float32), query_scaled, out=cosine[start:stop])
+        np.clip(cosine, -1.0, 1.0, out=cosine)
+    
+    # Rescale from [-1, 1] to [0, 1] in place so 1 = identical, 0 = opposite
+    similarities = cosine
+    similarities += 1.0
+    similarities *= 0.5
+    if profession_allowed is not None:
+        similarities[~profession_allowed] = -np.inf
+    
+    # Select the top results in linear time, then sort only those (descending)
+    top_idx = np.argpartition(-similarities, k - 1)[:k]
+    top_idx = top_idx[np.argsort(-similarities[top_idx], kind='stable')]
+    return _expand_to_users(index, top_idx, similarities[top_idx], limit, user_allowed)
+
+
+def _expand_to_users(
+    index: VectorIndex,
+    rows: np.ndarray,
+    similarities: np.ndarray,
+    limit: int,
+    user_allowed: Optional[np.ndarray] = None,
+) -> List[Tuple[str, float, str]]:
+    """Fan ranked profession rows out to (user_id, similarity_score, profession) tuples."""
+    professions = index.professions
+    profession_users = index.profession_users
+    user_ids = index.user_ids
+    results = []
+    for row, similarity in zip(rows, similarities):
+        profession = professions[row]
+        for position in profession_users[row]:
+            if user_allowed is not None and not user_allowed[position]:
+                continue
+            results.append((user_ids[position], float(similarity), profession))
+            if len(results) >= limit:
+                return results
+    return results
+
+
+@lru_cache(maxsize=1024)
+def _encode_query(text: str) -> np.ndarray:
+    """Encode a normalized query string into a read-only unit-length embedding."""
+    embedding = np.ascontiguousarray(
+        _model.encode([text], show_progress_bar=False, normalize_embeddings=True)[0], dtype=np.float32
+    )
+    embedding.setflags(write=False)
+    return embedding
 
 
 def close_connection():
     """Clear the in-memory embeddings (useful for testing)."""
-    global _embeddings, _professions
-    _embeddings.clear()
-    _professions.clear()
+    global _vector_index
+    _encode_query.cache_clear()
+    _vector_index = None
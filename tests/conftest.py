@@ -0,0 +1,41 @@
+"""
+Shared pytest configuration.
+"""
+import zlib
+
+import numpy as np
+
+
+def pytest_configure(config):
+    """Give the session one place to keep parsed test CSVs, keyed by path."""
+    config._parsed_users = {}
+
+
+class StandInModel:
+    """
+    Stand-in for SentenceTransformer, so tests exercise the real search path without loading a transformer model.
+    
+    Texts listed in `embeddings` (matched case-insensitively) get those vectors. Any other text gets
+    `default` when one is given, otherwise a fixed pseudo-random vector of `dim` components derived from the text.
+    """
+    
+    def __init__(self, embeddings=None, default=None, dim=16, backend='stand-in'):
+        self.embeddings = {text.lower(): vector for text, vector in (embeddings or {}).items()}
+        self.default = default
+        self.dim = dim
+        self.backend = backend
+        self.encode_calls = 0
+    
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        self.encode_calls += 1
+        embeddings = np.array([self._embed(text.lower()) for text in sentences], dtype=np.float32)
+        if normalize_embeddings:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+    
+    def _embed(self, text):
+        if text in self.embeddings:
+            return self.embeddings[text]
+        if self.default is not None:
+            return self.default
+        return np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.dim)
@@ -7,7 +7,15 @@ import csv
 from pathlib import Path
 from datetime import date
 
-from api.csv_reader import load_users, get_user_by_id, clear_cache
+from api.csv_reader import load_users, get_user_by_id, get_user_dict, get_user_columns, clear_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_csv_cache():
+    """Start each test with an empty CSV cache and leave none behind for later tests."""
+    clear_cache()
+    yield
+    clear_cache()
 
 
 @pytest.fixture
@@ -42,12 +50,10 @@ def sample_csv_file():
     
     # Cleanup
     Path(temp_path).unlink()
-    clear_cache()
 
 
 def test_load_users(sample_csv_file):
     """Test loading users from CSV file."""
-    clear_cache()
     users = load_users(sample_csv_file)
     
     assert len(users) == 2
@@ -61,7 +67,6 @@ def test_load_users(sample_csv_file):
 
 def test_load_users_caching(sample_csv_file):
     """Test that CSV data is cached after first load."""
-    clear_cache()
     users1 = load_users(sample_csv_file)
     users2 = load_users(sample_csv_file)
     
@@ -71,8 +76,6 @@ def test_load_users_caching(sample_csv_file):
 
 def test_get_user_by_id(sample_csv_file, monkeypatch):
     """Test getting a user by ID."""
-    clear_cache()
-    
     # Monkeypatch load_users to use test CSV
     import api.csv_reader
     original_load = api.csv_reader.load_users
@@ -83,7 +86,6 @@ def test_get_user_by_id(sample_csv_file, monkeypatch):
         return original_load(csv_path)
     
     monkeypatch.setattr(api.csv_reader, 'load_users', mock_load_users)
-    clear_cache()
     
     user = get_user_by_id('1')
     
@@ -94,8 +96,6 @@ def test_get_user_by_id(sample_csv_file, monkeypatch):
 
 def test_get_user_by_id_not_found(sample_csv_file, monkeypatch):
     """Test getting a non-existent user ID."""
-    clear_cache()
-    
     # Monkeypatch load_users to use test CSV
     import api.csv_reader
     original_load = api.csv_reader.load_users
@@ -106,23 +106,92 @@ def test_get_user_by_id_not_found(sample_csv_file, monkeypatch):
         return original_load(csv_path)
     
     monkeypatch.setattr(api.csv_reader, 'load_users', mock_load_users)
-    clear_cache()
     
     user = get_user_by_id('999')
     
     assert user is None
 
 
+def test_get_user_dict(sample_csv_file):
+    """Test that the ID index covers all users and is cached."""
+    users = load_users(sample_csv_file)
+    user_dict = get_user_dict()
+    
+    assert set(user_dict) == {'1', '2'}
+    assert user_dict['2'] is users[1]
+    assert get_user_dict() is user_dict
+
+
+def test_get_user_columns(sample_csv_file):
+    """Test that filter columns are aligned with the loaded rows."""
+    load_users(sample_csv_file)
+    columns = get_user_columns()
+    
+    assert str(columns['created_date'][0]) == '2023-01-15'
+    assert str(columns['created_date'][1]) == '2023-06-20'
+    assert list(columns['profession_lower']) == ['software engineer', 'data scientist']
+
+
+def test_get_user_by_id_from_given_users():
+    """Test looking up a user in an explicitly provided list."""
+    users = [{'id': '7', 'name': 'Given User', 'profession': 'Pilot', 'created_date': date(2024, 2, 1)}]
+    
+    assert get_user_by_id('7', users) is users[0]
+    assert get_user_by_id('1', users) is None
+    assert list(get_user_columns(users)['profession_lower']) == ['pilot']
+
+
+def test_get_user_by_id_duplicate_ids_returns_first(tmp_path):
+    """Test that the first row wins when several rows share an ID."""
+    csv_path = tmp_path / 'users.csv'
+    csv_path.write_text(
+        "id,name,profession,created_date,age\n"
+        "1,First,Engineer,2023-01-15,30\n"
+        "1,Second,Doctor,2023-02-15,40\n",
+        encoding='utf-8',
+    )
+    users = load_users(str(csv_path))
+    
+    assert get_user_by_id('1')['name'] == 'First'
+    assert get_user_dict()['1'] is users[0]
+    
+    # Same for an explicitly given list, which is indexed separately
+    given = [dict(user) for user in users]
+    assert get_user_by_id('1', given) is given[0]
+
+
+def test_load_users_blank_fields_match_csv_fallback(tmp_path, monkeypatch):
+    """Test that the Arrow reader and the csv.DictReader fallback treat blank fields alike."""
+    csv_path = tmp_path / 'users.csv'
+    csv_path.write_text(
+        "id,name,profession,created_date,age\n"
+        "1,A,Engineer,2023-01-15,30\n"
+        "2,B,NA,,\n",
+        encoding='utf-8',
+    )
+    
+    arrow_users = load_users(str(csv_path))
+    arrow_dates = get_user_columns()['created_date']
+    
+    clear_cache()
+    import api.csv_reader
+    monkeypatch.setattr(api.csv_reader, 'pa', None)
+    csv_users = load_users(str(csv_path))
+    csv_dates = get_user_columns()['created_date']
+    
+    assert csv_users[1] == {'id': '2', 'name': 'B', 'profession': 'NA', 'created_date': '', 'age': ''}
+    assert arrow_users == csv_users
+    assert arrow_dates.tolist() == csv_dates.tolist()
+
+
 def test_load_users_file_not_found():
     """Test loading users from non-existent file."""
-    clear_cache()
     with pytest.raises(FileNotFoundError):
         load_users('/nonexistent/file.csv')
 
 
 def test_load_users_invalid_date():
     """Test loading CSV with invalid date format."""
-    clear_cache()
     with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=['id', 'name', 'email', 'profession', 'created_date', 'age', 'location', 'phone'])
         writer.writeheader()
@@ -143,4 +212,3 @@ def test_load_users_invalid_date():
             load_users(temp_path)
     finally:
         Path(temp_path).unlink()
-        clear_cache()
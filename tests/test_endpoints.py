@@ -1,140 +1,186 @@
 """
 Tests for API endpoints.
 """
+import asyncio
+import httpx
 import pytest
-import tempfile
 import csv
-from pathlib import Path
+from datetime import date
 from fastapi.testclient import TestClient
 
-from api.main import app
-from api.csv_reader import clear_cache
+import api.main as _main_mod
+import api.vector_search as _vector_search_mod
+from api.main import app, get_user_loader
 from api.vector_search import close_connection
+from tests.conftest import StandInModel
 
 
-@pytest.fixture(autouse=True)
-def clear_caches():
-    """Clear all caches before each test."""
-    clear_cache()
-    close_connection()
+@pytest.fixture(scope="session", autouse=True)
+def close_vector_search():
+    """Release the in-memory embeddings once the whole session is done."""
     yield
-    # Cleanup after test
-    clear_cache()
     close_connection()
 
 
-@pytest.fixture
-def sample_csv_data():
-    """Create a temporary CSV file with sample data."""
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', newline='') as f:
+# Date filter boundaries used in the search tests
+D_2023_01_01 = date(2023, 1, 1)
+D_2023_01_31 = date(2023, 1, 31)
+D_2023_06_01 = date(2023, 6, 1)
+D_2023_06_30 = date(2023, 6, 30)
+
+# Diverse professions for semantic search testing
+_SAMPLE_ROWS = [
+    {
+        'id': '1',
+        'name': 'John Doe',
+        'email': 'john.doe@example.com',
+        'profession': 'Software Engineer',
+        'created_date': '2023-01-15',
+        'age': '30',
+        'location': 'New York, NY',
+        'phone': '555-1234'
+    },
+    {
+        'id': '2',
+        'name': 'Jane Smith',
+        'email': 'jane.smith@example.com',
+        'profession': 'Software Developer',
+        'created_date': '2023-06-20',
+        'age': '28',
+        'location': 'San Francisco, CA',
+        'phone': '555-5678'
+    },
+    {
+        'id': '3',
+        'name': 'Bob Johnson',
+        'email': 'bob.johnson@example.com',
+        'profession': 'Doctor',
+        'created_date': '2022-03-10',
+        'age': '45',
+        'location': 'Boston, MA',
+        'phone': '555-9012'
+    },
+    {
+        'id': '4',
+        'name': 'Alice Williams',
+        'email': 'alice.williams@example.com',
+        'profession': 'Physician',
+        'created_date': '2023-09-05',
+        'age': '38',
+        'location': 'Chicago, IL',
+        'phone': '555-3456'
+    },
+]
+
+
+@pytest.fixture(scope="session")
+def sample_csv_data(tmp_path_factory):
+    """Create a temporary CSV file with sample data (written once per session)."""
+    csv_path = tmp_path_factory.mktemp("csv") / "users.csv"
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=['id', 'name', 'email', 'profession', 'created_date', 'age', 'location', 'phone'])
         writer.writeheader()
-        # Add diverse professions for semantic search testing
-        writer.writerow({
-            'id': '1',
-            'name': 'John Doe',
-            'email': 'john.doe@example.com',
-            'profession': 'Software Engineer',
-            'created_date': '2023-01-15',
-            'age': '30',
-            'location': 'New York, NY',
-            'phone': '555-1234'
-        })
-        writer.writerow({
-            'id': '2',
-            'name': 'Jane Smith',
-            'email': 'jane.smith@example.com',
-            'profession': 'Software Developer',
-            'created_date': '2023-06-20',
-            'age': '28',
-            'location': 'San Francisco, CA',
-            'phone': '555-5678'
-        })
-        writer.writerow({
-            'id': '3',
-            'name': 'Bob Johnson',
-            'email': 'bob.johnson@example.com',
-            'profession': 'Doctor',
-            'created_date': '2022-03-10',
-            'age': '45',
-            'location': 'Boston, MA',
-            'phone': '555-9012'
-        })
-        writer.writerow({
-            'id': '4',
-            'name': 'Alice Williams',
-            'email': 'alice.williams@example.com',
-            'profession': 'Physician',
-            'created_date': '2023-09-05',
-            'age': '38',
-            'location': 'Chicago, IL',
-            'phone': '555-3456'
-        })
-        temp_path = f.name
+        writer.writerows(_SAMPLE_ROWS)
     
-    yield temp_path
+    return str(csv_path)
+
+
+# Hand-picked embeddings for the sample professions and the queries used below,
+# so tests exercise the real search path without loading a transformer model.
+# Axes: software, medicine, engineering, other
+_PRECOMPUTED_EMBEDDINGS = {
+    'software engineer': [0.8, 0.0, 0.6, 0.0],
+    'software developer': [1.0, 0.0, 0.1, 0.0],
+    'doctor': [0.0, 1.0, 0.0, 0.0],
+    'physician': [0.0, 0.95, 0.05, 0.0],
+    'programmer': [1.0, 0.0, 0.2, 0.0],
+    'engineer': [0.3, 0.0, 1.0, 0.0],
+}
+_UNKNOWN_EMBEDDING = [0.0, 0.0, 0.0, 1.0]
+
+
+def _parse_users_csv(config, csv_path):
+    """Parse a users CSV into typed rows, once per path for the whole session."""
+    parsed_users = config._parsed_users
+    if csv_path in parsed_users:
+        return parsed_users[csv_path]
     
-    # Cleanup
-    Path(temp_path).unlink()
-    clear_cache()
-    close_connection()
+    users = []
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # Parse created_date string to date object
+            if 'created_date' in row and row['created_date']:
+                try:
+                    row['created_date'] = date.fromisoformat(row['created_date'])
+                except ValueError as e:
+                    raise ValueError(f"Invalid date format in CSV: {row.get('created_date')}") from e
+            
+            # Ensure age is an integer
+            if 'age' in row and row['age']:
+                try:
+                    row['age'] = int(row['age'])
+                except ValueError:
+                    pass
+            
+            users.append(row)
+    
+    parsed_users[csv_path] = tuple(users)
+    return parsed_users[csv_path]
 
 
-@pytest.fixture
-def client(sample_csv_data, monkeypatch):
-    """Create a test client with sample data."""
-    # Clear cache first
-    clear_cache()
-    close_connection()
-    
-    # Import modules to patch
-    import api.csv_reader
-    import api.main
-    
+@pytest.fixture(scope="session")
+def app_client(sample_csv_data, tmp_path_factory, pytestconfig):
+    """Start the app once per session with sample data, so startup and model loading run once."""
     # Create a mock that completely bypasses cache and loads directly from test CSV
     def mock_load_users(csv_path=None):
         # Always use test CSV when no path is specified
         if csv_path is None:
             csv_path = sample_csv_data
         
-        # Bypass cache completely - load directly from file
-        from pathlib import Path
-        import csv
-        from datetime import datetime
-        
-        csv_path = Path(csv_path)
-        users = []
-        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Parse created_date string to date object
-                if 'created_date' in row and row['created_date']:
-                    try:
-                        row['created_date'] = datetime.strptime(row['created_date'], '%Y-%m-%d').date()
-                    except ValueError as e:
-                        raise ValueError(f"Invalid date format in CSV: {row.get('created_date')}") from e
-                
-                # Ensure age is an integer
-                if 'age' in row and row['age']:
-                    try:
-                        row['age'] = int(row['age'])
-                    except ValueError:
-                        pass
-                
-                users.append(row)
+        # Bypass the app cache; the file is parsed once and each call gets fresh row dicts
+        return [dict(row) for row in _parse_users_csv(pytestconfig, str(csv_path))]
+    
+    # monkeypatch is function-scoped, so use a MonkeyPatch context that lives for the session;
+    # both the attribute patch and the loader override are undone even if startup fails
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(_main_mod, 'EMBEDDING_CACHE_DIR', tmp_path_factory.mktemp('embeddings'))
+        # Skip model download and inference; query embeddings from any real model are dropped
+        mp.setattr(_vector_search_mod, '_model', StandInModel(_PRECOMPUTED_EMBEDDINGS, default=_UNKNOWN_EMBEDDING))
+        _vector_search_mod._encode_query.cache_clear()
+        # Route handlers (and startup) get their loader from this dependency
+        mp.setitem(app.dependency_overrides, get_user_loader, lambda: mock_load_users)
         
-        return users
+        # Use TestClient with context manager to ensure startup events run properly
+        # This also ensures the overridden loader is used during startup
+        with TestClient(app) as test_client:
+            # Vector search initializes in the background; wait so search tests are deterministic,
+            # and fail the session rather than every search test if it did not succeed
+            test_client.portal.call(asyncio.wait_for, app.state.vector_init_task, 120)
+            if app.state.vector_init_error is not None:
+                raise RuntimeError("Vector search initialization failed") from app.state.vector_init_error
+            yield test_client
+
+
+@pytest.fixture
+def client(app_client):
+    """Test client backed by the shared session app."""
+    return app_client
+
+
+def get_concurrently(*urls):
+    """
+    Issue several GET requests concurrently against the app's ASGI interface.
     
-    # Patch BOTH where it's defined AND where it's imported/used
-    # This is critical: api.main imports load_users, so we need to patch both
-    monkeypatch.setattr(api.csv_reader, 'load_users', mock_load_users)
-    monkeypatch.setattr(api.main, 'load_users', mock_load_users)
-    monkeypatch.setattr(api.csv_reader, '_cached_data', None)
+    Requires the app to have been started (e.g. via the client fixture), since
+    ASGITransport does not run startup events.
+    """
+    async def fetch_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.get(url) for url in urls))
     
-    # Use TestClient with context manager to ensure startup events run properly
-    # This also ensures the patched function is used during startup
-    with TestClient(app) as test_client:
-        yield test_client
+    return asyncio.run(fetch_all())
 
 
 def test_root_endpoint(client):
@@ -172,62 +218,23 @@ def test_get_users_no_filters(client):
     assert len(data) == 4
 
 
-def test_get_users_filter_by_start_date(client):
-    """Test filtering users by start_date."""
-    response = client.get("/users?start_date=2023-06-01")
-    assert response.status_code == 200
-    data = response.json()
-    assert len(data) == 2  # Only users created on/after June 1, 2023
-    assert all(user['created_date'] >= '2023-06-01' for user in data)
-
-
-def test_get_users_filter_by_end_date(client):
-    """Test filtering users by end_date."""
-    response = client.get("/users?end_date=2023-01-31")
-    assert response.status_code == 200
+@pytest.mark.parametrize("query,expected_ids,status", [
+    ("start_date=2023-06-01", {"2", "4"}, 200),  # Created on/after June 1, 2023
+    ("end_date=2023-01-31", {"1", "3"}, 200),  # 2023-01-15 and 2022-03-10
+    ("start_date=2023-01-01&end_date=2023-06-30", {"1", "2"}, 200),  # 2023-01-15 and 2023-06-20
+    ("profession=Software Engineer", {"1"}, 200),  # Exact profession match
+    ("profession=software engineer", {"1"}, 200),  # Profession match is case-insensitive
+    ("start_date=invalid-date", None, 400),  # Invalid date format
+])
+def test_get_users_filters(client, query, expected_ids, status):
+    """Test filtering users by date range and profession."""
+    response = client.get(f"/users?{query}")
+    assert response.status_code == status
     data = response.json()
-    assert len(data) == 2  # Users created before/on Jan 31, 2023: User 1 (2023-01-15) and User 3 (2022-03-10)
-    user_ids = [user['id'] for user in data]
-    assert '1' in user_ids  # 2023-01-15
-    assert '3' in user_ids  # 2022-03-10
-    assert all(user['created_date'] <= '2023-01-31' for user in data)
-
-
-def test_get_users_filter_by_date_range(client):
-    """Test filtering users by date range."""
-    response = client.get("/users?start_date=2023-01-01&end_date=2023-06-30")
-    assert response.status_code == 200
-    data = response.json()
-    assert len(data) == 2  # Users created between Jan 1 and June 30, 2023: User 1 (2023-01-15) and User 2 (2023-06-20)
-    user_ids = [user['id'] for user in data]
-    assert '1' in user_ids  # 2023-01-15
-    assert '2' in user_ids  # 2023-06-20
-    assert all('2023-01-01' <= user['created_date'] <= '2023-06-30' for user in data)
-
-
-def test_get_users_filter_by_profession(client):
-    """Test filtering users by exact profession match."""
-    response = client.get("/users?profession=Software Engineer")
-    assert response.status_code == 200
-    data = response.json()
-    assert len(data) == 1
-    assert data[0]['profession'] == 'Software Engineer'
-
-
-def test_get_users_filter_by_profession_case_insensitive(client):
-    """Test that profession filter is case-insensitive."""
-    response = client.get("/users?profession=software engineer")
-    assert response.status_code == 200
-    data = response.json()
-    assert len(data) == 1
-    assert data[0]['profession'] == 'Software Engineer'
-
-
-def test_get_users_invalid_date_format(client):
-    """Test filtering with invalid date format."""
-    response = client.get("/users?start_date=invalid-date")
-    assert response.status_code == 400
-    assert "Invalid" in response.json()["detail"]
+    if expected_ids is None:
+        assert "Invalid" in data["detail"]
+    else:
+        assert {user['id'] for user in data} == expected_ids
 
 
 def test_search_users_by_profession(client):
@@ -260,13 +267,48 @@ def test_search_users_by_profession_required_parameter(client):
     assert response.status_code == 422  # Validation error
 
 
+def test_search_users_by_profession_not_ready(client, monkeypatch):
+    """Test that search is unavailable until the vector index is built."""
+    monkeypatch.setattr(app.state, 'vector_ready', asyncio.Event())
+    search_response, users_response = get_concurrently("/users/search?profession=programmer", "/users")
+    assert search_response.status_code == 503
+    
+    # Non-vector endpoints are still served
+    assert users_response.status_code == 200
+
+
+def test_search_users_by_profession_init_failed(client, monkeypatch):
+    """Test that search reports the error when the vector index could not be built."""
+    monkeypatch.setattr(app.state, 'vector_init_error', RuntimeError("model download failed"))
+    search_response, users_response = get_concurrently("/users/search?profession=programmer", "/users")
+    assert search_response.status_code == 500
+    assert "model download failed" in search_response.json()['detail']
+    
+    # Non-vector endpoints are still served
+    assert users_response.status_code == 200
+
+
+def test_shutdown_cancels_pending_vector_init(monkeypatch):
+    """Test that shutdown does not leave a vector index build pending."""
+    async def start_and_shut_down():
+        init_task = asyncio.create_task(asyncio.sleep(3600))
+        monkeypatch.setattr(app.state, 'vector_init_task', init_task)
+        await _main_mod.shutdown_event()
+        return init_task
+    
+    init_task = asyncio.run(start_and_shut_down())
+    assert init_task.cancelled()
+    assert app.state.vector_init_task is None
+
+
 def test_search_users_by_profession_limit_validation(client):
     """Test that limit parameter is validated."""
-    response = client.get("/users/search?profession=engineer&limit=0")
-    assert response.status_code == 422  # Validation error (limit must be >= 1)
-    
-    response = client.get("/users/search?profession=engineer&limit=101")
-    assert response.status_code == 422  # Validation error (limit must be <= 100)
+    too_small, too_large = get_concurrently(
+        "/users/search?profession=engineer&limit=0",
+        "/users/search?profession=engineer&limit=101",
+    )
+    assert too_small.status_code == 422  # Validation error (limit must be >= 1)
+    assert too_large.status_code == 422  # Validation error (limit must be <= 100)
 
 
 def test_search_users_by_profession_with_start_date(client):
@@ -278,7 +320,19 @@ def test_search_users_by_profession_with_start_date(client):
     # All results should be on/after the start date
     for user in data:
         if user.get('created_date'):
-            assert user['created_date'] >= '2023-06-01'
+            assert date.fromisoformat(user['created_date']) >= D_2023_06_01
+
+
+def test_search_users_by_profession_date_filter_fills_limit(client):
+    """Test that a date filter excluding the best match still returns `limit` users."""
+    response = client.get("/users/search?profession=doctor&start_date=2023-01-01&limit=2")
+    assert response.status_code == 200
+    data = response.json()
+    
+    # Doctor (2022) is filtered out before ranking, so the next best users fill the limit
+    assert len(data) == 2
+    assert data[0]['profession'] == 'Physician'
+    assert all(date.fromisoformat(user['created_date']) >= D_2023_01_01 for user in data)
 
 
 def test_search_users_by_profession_with_end_date(client):
@@ -289,7 +343,7 @@ def test_search_users_by_profession_with_end_date(client):
     # All results should be on/before the end date
     for user in data:
         if user.get('created_date'):
-            assert user['created_date'] <= '2023-01-31'
+            assert date.fromisoformat(user['created_date']) <= D_2023_01_31
 
 
 def test_search_users_by_profession_with_date_range(client):
@@ -300,7 +354,7 @@ def test_search_users_by_profession_with_date_range(client):
     # All results should be within the date range
     for user in data:
         if user.get('created_date'):
-            assert '2023-01-01' <= user['created_date'] <= '2023-06-30'
+            assert D_2023_01_01 <= date.fromisoformat(user['created_date']) <= D_2023_06_30
 
 
 def test_search_users_by_profession_invalid_date_format(client):
@@ -0,0 +1,258 @@
+"""
+Tests for the vector search module.
+"""
+from dataclasses import replace
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import api.vector_search as _vector_search_mod
+from api.vector_search import initialize_vector_db, search_similar_professions
+from tests.conftest import StandInModel
+
+EMBEDDING_DIM = 16
+
+# More unique professions than HNSW_MIN_ELEMENTS, with some shared by several users
+NUM_PROFESSIONS = _vector_search_mod.HNSW_MIN_ELEMENTS + 100
+_USERS = [
+    {
+        'id': str(i),
+        'profession': f"Profession {i % NUM_PROFESSIONS}",
+        'created_date': date(2023, 1, 1) + timedelta(days=i % 365),
+    }
+    for i in range(NUM_PROFESSIONS + 200)
+]
+
+_QUERIES = ['profession 7', 'profession 512', 'unlisted job title']
+
+# Largest score difference expected from int8 rounding of the embeddings and the query
+QUANTIZATION_ATOL = 0.01
+
+
+@pytest.fixture
+def counting_model(monkeypatch):
+    """Install a counting stand-in model, dropping its state when the test is done."""
+    model = StandInModel(dim=EMBEDDING_DIM)
+    monkeypatch.setattr(_vector_search_mod, '_model', model)
+    yield model
+    _vector_search_mod.close_connection()
+
+
+@pytest.fixture(scope="module")
+def indexes():
+    """Build the HNSW, exact and int8-quantized indexes once with the stand-in model."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(_vector_search_mod, '_model', StandInModel(dim=EMBEDDING_DIM))
+        exact = initialize_vector_db(_USERS)
+        quantized = initialize_vector_db(_USERS, quantize=True)
+        yield {
+            'hnsw': exact,
+            'exact': replace(exact, hnsw=None),
+            'quantized': replace(quantized, hnsw=None),
+        }
+        # Drop query embeddings from the stand-in model along with the default index
+        _vector_search_mod.close_connection()
+
+
+def _in_date_range(user, start_date, end_date):
+    """Whether the user was created within the (optional) date range."""
+    created_date = user['created_date']
+    return (start_date is None or created_date >= start_date) and (end_date is None or created_date <= end_date)
+
+
+def _brute_force_search(query, limit, start_date=None, end_date=None):
+    """Reference search: score every user in range on its own, then sort by score."""
+    model = StandInModel(dim=EMBEDDING_DIM)
+    query_embedding = model.encode([query], normalize_embeddings=True)[0].astype(np.float64)
+    scored = []
+    for user in _USERS:
+        if _in_date_range(user, start_date, end_date):
+            embedding = model.encode([user['profession']], normalize_embeddings=True)[0].astype(np.float64)
+            scored.append((user['id'], (float(embedding @ query_embedding) + 1.0) / 2.0))
+    # Stable sort, so users sharing a profession keep their CSV order
+    scored.sort(key=lambda result: -result[1])
+    return scored[:limit]
+
+
+@pytest.fixture
+def candidate_mask():
+    """Mask that keeps every third user."""
+    mask = np.zeros(len(_USERS), dtype=bool)
+    mask[::3] = True
+    return mask
+
+
+@pytest.mark.parametrize("query", _QUERIES)
+@pytest.mark.parametrize("start_date, end_date", [
+    (None, None),
+    (date(2023, 6, 1), None),
+    (date(2023, 3, 1), date(2023, 3, 10)),
+])
+def test_exact_scan_matches_brute_force(indexes, query, start_date, end_date):
+    """Test the exact scan, date filter and fan-out to users against per-user scoring."""
+    mask = None
+    if start_date or end_date:
+        mask = np.array([_in_date_range(user, start_date, end_date) for user in _USERS])
+    
+    results = search_similar_professions(query, limit=25, index=indexes['exact'], candidate_mask=mask)
+    expected = _brute_force_search(query, 25, start_date, end_date)
+    
+    assert len(results) == 25
+    assert [user_id for user_id, _, _ in results] == [user_id for user_id, _ in expected]
+    assert np.allclose([score for _, score, _ in results], [score for _, score in expected], atol=1e-5)
+    assert all(profession == _USERS[int(user_id)]['profession'] for user_id, _, profession in results)
+
+
+@pytest.mark.parametrize("query", _QUERIES)
+@pytest.mark.parametrize("use_mask", [False, True])
+def test_quantized_scan_matches_exact_scan(indexes, candidate_mask, query, use_mask, monkeypatch):
+    """Test that int8-quantized scoring finds the float32 top-k up to quantization error."""
+    # Score in several blocks, the last one partial
+    monkeypatch.setattr(_vector_search_mod, 'QUANTIZED_BLOCK_ROWS', 256)
+    mask = candidate_mask if use_mask else None
+    assert indexes['quantized'].matrix.dtype == np.int8
+    
+    exact = search_similar_professions(query, limit=10, index=indexes['exact'], candidate_mask=mask)
+    quantized = search_similar_professions(query, limit=10, index=indexes['quantized'], candidate_mask=mask)
+    exact_scores = {
+        user_id: score
+        for user_id, score, _ in search_similar_professions(query, limit=len(_USERS), index=indexes['exact'])
+    }
+    
+    # Near-ties may swap places, but every result must score within the error of the exact top-k
+    assert len(quantized) == len(exact) == 10
+    assert np.allclose([score for _, score, _ in quantized], [score for _, score, _ in exact], atol=QUANTIZATION_ATOL)
+    for user_id, score, _ in quantized:
+        assert abs(score - exact_scores[user_id]) <= QUANTIZATION_ATOL
+        assert exact_scores[user_id] >= exact[-1][1] - 2 * QUANTIZATION_ATOL
+        if mask is not None:
+            assert mask[int(user_id)]
+
+
+@pytest.mark.skipif(_vector_search_mod.hnswlib is None, reason="hnswlib not installed")
+@pytest.mark.parametrize("query", _QUERIES)
+@pytest.mark.parametrize("use_mask", [False, True])
+def test_hnsw_search_matches_exact_scan(indexes, candidate_mask, query, use_mask):
+    """Test that the HNSW graph returns the same top-k as the exhaustive scan."""
+    mask = candidate_mask if use_mask else None
+    assert indexes['hnsw'].hnsw is not None
+    
+    exact = search_similar_professions(query, limit=10, index=indexes['exact'], candidate_mask=mask)
+    approximate = search_similar_professions(query, limit=10, index=indexes['hnsw'], candidate_mask=mask)
+    
+    assert len(exact) == 10
+    assert [user_id for user_id, _, _ in approximate] == [user_id for user_id, _, _ in exact]
+    assert np.allclose([score for _, score, _ in approximate], [score for _, score, _ in exact], atol=1e-5)
+    if mask is not None:
+        assert all(mask[int(user_id)] for user_id, _, _ in approximate)
+
+
+class _TorchOnlySentenceTransformer:
+    """Stand-in for SentenceTransformer that fails like sentence-transformers does without the ONNX extras."""
+    
+    def __init__(self, model_name, backend='torch', **kwargs):
+        if backend == 'onnx':
+            raise Exception("Using the ONNX backend requires installing Optimum and ONNX Runtime.")
+        self.model_name = model_name
+        self.backend = backend
+
+
+def test_load_model_without_onnx_extras_uses_torch(monkeypatch):
+    """Test that the PyTorch model is loaded when the ONNX extras are missing."""
+    monkeypatch.setattr(_vector_search_mod.torch.cuda, 'is_available', lambda: False)
+    monkeypatch.setattr(_vector_search_mod, '_onnx_available', lambda: False)
+    monkeypatch.setattr(_vector_search_mod, 'SentenceTransformer', _TorchOnlySentenceTransformer)
+    
+    model = _vector_search_mod._load_model()
+    
+    assert model.backend == 'torch'
+    assert model.model_name == _vector_search_mod.MODEL_NAME
+
+
+def test_load_model_with_onnx_extras_uses_quantized_onnx(monkeypatch):
+    """Test that the int8 ONNX export is requested when the ONNX extras are installed."""
+    monkeypatch.setattr(_vector_search_mod.torch.cuda, 'is_available', lambda: False)
+    monkeypatch.setattr(_vector_search_mod, '_onnx_available', lambda: True)
+    monkeypatch.setattr(_vector_search_mod, '_onnx_model_file', lambda: 'onnx/model.onnx')
+    monkeypatch.setattr(_vector_search_mod, 'SentenceTransformer', lambda model_name, **kwargs: kwargs)
+    
+    kwargs = _vector_search_mod._load_model()
+    
+    assert kwargs == {'backend': 'onnx', 'model_kwargs': {'file_name': 'onnx/model.onnx'}}
+
+
+def test_onnx_unavailable_without_optimum_onnxruntime(monkeypatch):
+    """Test that optimum alone, without its onnxruntime integration, does not select the ONNX backend."""
+    installed = {'onnxruntime', 'optimum'}
+    monkeypatch.setattr(
+        _vector_search_mod.importlib.util, 'find_spec', lambda name: object() if name in installed else None
+    )
+    
+    assert not _vector_search_mod._onnx_available()
+    installed.add('optimum.onnxruntime')
+    assert _vector_search_mod._onnx_available()
+
+
+@pytest.mark.parametrize("machine, flags, expected", [
+    ('aarch64', set(), 'arm64'),
+    ('arm64', set(), 'arm64'),
+    ('x86_64', {'avx2', 'avx512f', 'avx512_vnni'}, 'avx512_vnni'),
+    ('x86_64', {'avx2', 'avx512f'}, 'avx2'),
+    ('AMD64', set(), 'avx2'),
+])
+def test_onnx_model_file_matches_cpu(monkeypatch, machine, flags, expected):
+    """Test that the ONNX export is chosen for the CPU it was quantized for."""
+    monkeypatch.setattr(_vector_search_mod.platform, 'machine', lambda: machine)
+    monkeypatch.setattr(_vector_search_mod, '_cpu_flags', lambda: flags)
+    
+    assert _vector_search_mod._onnx_model_file() == _vector_search_mod.ONNX_MODEL_FILES[expected]
+
+
+def test_embedding_cache_reused(counting_model, tmp_path):
+    """Test that a second build with the same professions loads the cached embeddings."""
+    users = _USERS[:50]
+    first = initialize_vector_db(users, db_path=tmp_path)
+    assert counting_model.encode_calls == 1
+    
+    second = initialize_vector_db(users, db_path=tmp_path)
+    
+    assert counting_model.encode_calls == 1
+    assert np.array_equal(second.matrix, first.matrix)
+    assert second.professions == first.professions
+
+
+def test_embedding_cache_removes_stale_files(counting_model, tmp_path):
+    """Test that caching a new profession list replaces the old cache file."""
+    initialize_vector_db(_USERS[:50], db_path=tmp_path)
+    initialize_vector_db(_USERS[:60], db_path=tmp_path)
+    
+    cache_files = list(tmp_path.glob('*.npy'))
+    assert len(cache_files) == 1
+    
+    # The surviving file is the current one, so rebuilding it needs no encoding
+    initialize_vector_db(_USERS[:60], db_path=tmp_path)
+    assert counting_model.encode_calls == 2
+
+
+@pytest.mark.parametrize("corrupt", ['truncated', 'wrong_rows', 'wrong_dim'])
+def test_embedding_cache_unusable_file_is_rebuilt(counting_model, tmp_path, corrupt):
+    """Test that a corrupt or mismatched cache file is replaced instead of failing the build."""
+    counting_model.get_sentence_embedding_dimension = lambda: EMBEDDING_DIM
+    users = _USERS[:50]
+    first = initialize_vector_db(users, db_path=tmp_path)
+    (cache_path,) = tmp_path.glob('*.npy')
+    if corrupt == 'truncated':
+        cache_path.write_bytes(cache_path.read_bytes()[:20])
+    elif corrupt == 'wrong_rows':
+        np.save(cache_path, np.asarray(first.matrix)[:10])
+    else:
+        np.save(cache_path, np.asarray(first.matrix)[:, :8])
+    
+    rebuilt = initialize_vector_db(users, db_path=tmp_path)
+    
+    assert counting_model.encode_calls == 2
+    assert np.array_equal(rebuilt.matrix, first.matrix)
+    # The rewritten cache is usable again
+    initialize_vector_db(users, db_path=tmp_path)
+    assert counting_model.encode_calls == 2